@@ -8,6 +8,7 @@ Available analyses:
 - top_games.py: Top games by average viewers and popularity metrics
 - peak_hours.py: Viewership patterns by hour of day
 - weekend_analysis.py: Weekend vs weekday viewership comparison
+- run_all.py: Runs all of the above on one shared database connection
 """
 
 __version__ = "1.0.0"
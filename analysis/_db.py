@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite access for the analysis scripts.
+Opens one tuned connection so several analyses can run back-to-back on a warm cache.
+"""
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "twitch.db"
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA busy_timeout=5000;"
+    "PRAGMA cache_size=-131072;"     # 128 MB page cache
+    "PRAGMA mmap_size=268435456;"    # 256 MB memory-mapped reads, skips read() copies on scans
+    "PRAGMA temp_store=MEMORY;"      # GROUP BY / ORDER BY scratch b-trees stay off disk
+)
+
+@contextmanager
+def connect(db_path: Path = DB_PATH):
+    """Yield a SQLite connection with the analysis pragmas applied; close it on exit."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(PRAGMAS)
+        yield conn
+    finally:
+        conn.close()
+
+def read_frame(query: str, conn, dtype: dict | None = None) -> pd.DataFrame:
+    """Run query into an Arrow-backed DataFrame with the given (narrow) column dtypes (needs pandas >= 2.0)."""
+    return pd.read_sql_query(query, conn, dtype=dtype, dtype_backend="pyarrow")
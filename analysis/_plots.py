@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Shared plotting helpers for the analysis scripts.
+PNG encoding runs on a small thread pool so the next figure can be built while the last one is written.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from pathlib import Path
+import matplotlib
+import pandas as pd
+
+# Headless runs (Airflow, CI) get the non-interactive Agg backend; import this module before pyplot
+SHOW_PLOTS = bool(os.getenv("DISPLAY"))
+if not SHOW_PLOTS:
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib import cycler
+
+# seaborn's "husl" palette, precomputed so seaborn isn't needed just to set colours
+HUSL_PALETTE = ('#f77189', '#bb9832', '#50b131', '#36ada4', '#3ba3ec', '#e866f4')
+
+PREVIEW_DPI = 150   # detailed multi-panel figures
+SUMMARY_DPI = 300   # single-panel summary figures
+
+RENDER_SIG = ".render.sig"   # sidecar in the output dir: {analysis name: signature of the data last plotted}
+
+_SAVE_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="savefig")
+
+# One reusable Figure per (subplot shape, figsize) so back-to-back analyses don't reallocate canvases
+_FIG_CACHE = {}
+_PENDING_SAVES = {}
+
+@cache
+def apply_style():
+    """Set the shared plot style; runs once, on the first figure rather than at import."""
+    plt.style.use('seaborn-v0_8')
+    plt.rcParams['axes.prop_cycle'] = cycler('color', HUSL_PALETTE)
+
+def get_fig(shape, size):
+    """Return a cleared cached Figure for this layout plus its axes (same squeezing as plt.subplots)."""
+    apply_style()
+    key = (shape, size)
+    fig = _FIG_CACHE.get(key)
+    if fig is not None and not plt.fignum_exists(fig.number):
+        # closed by the user (plt.show) or plt.close: pyplot no longer manages it, so it can't be shown again
+        _PENDING_SAVES.pop(fig, None)
+        fig = None
+    if fig is None:
+        fig = _FIG_CACHE[key] = plt.figure(figsize=size)
+    else:
+        # don't clear a figure that is still being written out
+        pending = _PENDING_SAVES.pop(fig, None)
+        if pending is not None:
+            pending.result()
+        fig.clear()
+        # clear() keeps the last tight_layout margins; start from the rcParams defaults like a new figure
+        fig.subplots_adjust(**{k: plt.rcParams[f"figure.subplot.{k}"]
+                               for k in ("left", "right", "bottom", "top", "wspace", "hspace")})
+    return fig, fig.subplots(*shape)
+
+def save_async(fig, path, dpi=PREVIEW_DPI):
+    """Queue fig.savefig on the worker pool and return its future."""
+    future = _PENDING_SAVES[fig] = _SAVE_POOL.submit(fig.savefig, path, dpi=dpi, bbox_inches='tight')
+    return future
+
+def wait_for_saves(futures):
+    """Block until every queued save has finished, re-raising any failure."""
+    for future in futures:
+        future.result()
+
+def maybe_show(*figs):
+    """Show the figures if a display is available, then close any that aren't kept for reuse."""
+    if SHOW_PLOTS:
+        plt.show()
+    cached = set(_FIG_CACHE.values())
+    for fig in figs:
+        if fig not in cached:
+            plt.close(fig)
+
+def render_signature(df, source):
+    """Hash of the plotted data, the analysis script and this module (DPI/style), so editing any forces a redraw."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(",".join(map(str, df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    h.update(Path(source).read_bytes())
+    h.update(Path(__file__).read_bytes())
+    return h.hexdigest()
+
+def _read_signatures(out_dir):
+    try:
+        return json.loads((out_dir / RENDER_SIG).read_text())
+    except (OSError, ValueError):
+        return {}
+
+def plots_up_to_date(name, signature, *paths):
+    """True when every PNG exists and was last drawn from the same data (interactive runs always redraw)."""
+    if SHOW_PLOTS or not all(Path(p).exists() for p in paths):
+        return False
+    return _read_signatures(Path(paths[0]).parent).get(name) == signature
+
+def record_render(name, signature, out_dir):
+    """Remember what was just plotted; written via os.replace so a crash can't leave a torn file."""
+    out_dir = Path(out_dir)
+    sigs = _read_signatures(out_dir)
+    sigs[name] = signature
+    tmp = out_dir / (RENDER_SIG + ".tmp")
+    tmp.write_text(json.dumps(sigs, indent=2))
+    os.replace(tmp, out_dir / RENDER_SIG)
@@ -3,51 +3,62 @@
 Peak Hours Analysis
 Analyses viewership patterns by hour of day and generates visualisations.
 """
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+try:
+    from ._plots import (SUMMARY_DPI, get_fig, maybe_show, plots_up_to_date, record_render,
+                         render_signature, save_async, wait_for_saves)
+except ImportError:  # run as a script: python analysis/peak_hours.py
+    from _plots import (SUMMARY_DPI, get_fig, maybe_show, plots_up_to_date, record_render,
+                        render_signature, save_async, wait_for_saves)
 from pathlib import Path
+try:
+    from ._db import connect, read_frame
+except ImportError:  # run as a script: python analysis/peak_hours.py
+    from _db import connect, read_frame
 import numpy as np
 
 # Set up paths
 ROOT = Path(__file__).resolve().parents[1]
-DB_PATH = ROOT / "db" / "twitch.db"
 OUTPUT_DIR = ROOT / "outputs" / "plots"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Set style for better-looking plots
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+def analyse_peak_hours(conn=None):
+    """Analyse viewership patterns by hour of day.
 
-def analyse_peak_hours():
-    """Analyse viewership patterns by hour of day."""
-    
-    # Connect to database
-    conn = sqlite3.connect(DB_PATH)
+    Pass an open connection to share it with the other analyses; otherwise one is opened here.
+    """
+    if conn is None:
+        with connect() as conn:
+            return analyse_peak_hours(conn)
     
     # Query for hourly analysis
     query = """
     SELECT 
         hour_of_day,
         COUNT(*) as stream_count,
-        AVG(viewer_count) as avg_viewers,
         SUM(viewer_count) as total_viewers,
         MAX(viewer_count) as max_viewers,
-        MIN(viewer_count) as min_viewers
+        MIN(viewer_count) as min_viewers,
+        NTILE(4) OVER (ORDER BY SUM(viewer_count) * 1.0 / COUNT(*)) as quartile
     FROM streams 
     WHERE hour_of_day IS NOT NULL
     GROUP BY hour_of_day 
     ORDER BY hour_of_day
     """
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = read_frame(query, conn, dtype={
+        'hour_of_day': 'int8[pyarrow]',
+        'quartile': 'int8',
+        'stream_count': 'int32[pyarrow]',
+    })
     
     if df.empty:
         print("No data found for analysis.")
         return
     
+    # Average from the SUM/COUNT already fetched rather than a separate AVG aggregate;
+    # numpy float keeps to_string formatters working
+    df['avg_viewers'] = df['total_viewers'].to_numpy(dtype=np.float64) / df['stream_count'].to_numpy(dtype=np.float64)
+    
     print("=== Peak Hours Analysis ===")
     print(f"Analysing viewership patterns across {len(df)} hours")
     
@@ -58,62 +69,72 @@ def analyse_peak_hours():
     print(f"\nPeak hour by average viewers: {int(peak_hour_avg['hour_of_day'])}:00 ({peak_hour_avg['avg_viewers']:,.0f} avg viewers)")
     print(f"Peak hour by total viewers: {int(peak_hour_total['hour_of_day'])}:00 ({peak_hour_total['total_viewers']:,.0f} total viewers)")
     
-    # Create visualisations
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
-    
-    # Plot 1: Average viewers by hour
-    hours = df['hour_of_day'].astype(int)
-    ax1.plot(hours, df['avg_viewers'], marker='o', linewidth=2, markersize=6, color='#2E86AB')
-    ax1.fill_between(hours, df['avg_viewers'], alpha=0.3, color='#2E86AB')
-    ax1.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
-    ax1.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
-    ax1.set_title('Average Viewers by Hour of Day', fontsize=14, fontweight='bold')
-    ax1.grid(True, alpha=0.3)
-    ax1.set_xticks(range(0, 24, 2))
-    
-    # Highlight peak hour
-    peak_hour_idx = df['avg_viewers'].idxmax()
-    ax1.axvline(x=df.loc[peak_hour_idx, 'hour_of_day'], color='red', linestyle='--', alpha=0.7)
-    ax1.annotate(f'Peak: {int(df.loc[peak_hour_idx, "hour_of_day"])}:00', 
-                xy=(df.loc[peak_hour_idx, 'hour_of_day'], df.loc[peak_hour_idx, 'avg_viewers']),
-                xytext=(10, 10), textcoords='offset points',
-                bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7),
-                arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
-    
-    # Plot 2: Total viewers by hour
-    ax2.bar(hours, df['total_viewers'], color='#A23B72', alpha=0.7, edgecolor='black', linewidth=0.5)
-    ax2.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
-    ax2.set_ylabel('Total Viewers', fontsize=12, fontweight='bold')
-    ax2.set_title('Total Viewers by Hour of Day', fontsize=14, fontweight='bold')
-    ax2.grid(True, alpha=0.3, axis='y')
-    ax2.set_xticks(range(0, 24, 2))
-    
-    # Highlight peak hour
-    peak_hour_total_idx = df['total_viewers'].idxmax()
-    ax2.axvline(x=df.loc[peak_hour_total_idx, 'hour_of_day'], color='red', linestyle='--', alpha=0.7)
-    
-    # Plot 3: Stream count by hour
-    ax3.bar(hours, df['stream_count'], color='#F18F01', alpha=0.7, edgecolor='black', linewidth=0.5)
-    ax3.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
-    ax3.set_ylabel('Number of Streams', fontsize=12, fontweight='bold')
-    ax3.set_title('Number of Streams by Hour of Day', fontsize=14, fontweight='bold')
-    ax3.grid(True, alpha=0.3, axis='y')
-    ax3.set_xticks(range(0, 24, 2))
-    
-    # Plot 4: Heatmap of viewers by hour (if we had more data)
-    # Create a simple distribution plot
-    ax4.hist(df['avg_viewers'], bins=20, color='#C73E1D', alpha=0.7, edgecolor='black')
-    ax4.set_xlabel('Average Viewers', fontsize=12, fontweight='bold')
-    ax4.set_ylabel('Frequency (Hours)', fontsize=12, fontweight='bold')
-    ax4.set_title('Distribution of Average Viewers Across Hours', fontsize=14, fontweight='bold')
-    ax4.grid(True, alpha=0.3, axis='y')
-    
-    plt.tight_layout()
-    
-    # Save the plot
+    # Redraw only when the hourly aggregates (or this script) changed since the PNGs were written
     output_path = OUTPUT_DIR / "peak_hours_analysis.png"
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"\n✅ Plot saved to: {output_path}")
+    output_path2 = OUTPUT_DIR / "peak_vs_offpeak_analysis.png"
+    signature = render_signature(df, __file__)
+    render = not plots_up_to_date("peak_hours", signature, output_path, output_path2)
+    
+    if render:
+        # Create visualisations
+        fig, ((ax1, ax2), (ax3, ax4)) = get_fig((2, 2), (16, 12))
+    
+        # Convert the plotted columns to ndarrays once so matplotlib doesn't re-unwrap each Series
+        hours = df['hour_of_day'].to_numpy(dtype=np.int8)
+        avg_v = df['avg_viewers'].to_numpy(dtype=np.float32)
+        total_v = df['total_viewers'].to_numpy(dtype=np.float32)
+        count_v = df['stream_count'].to_numpy(dtype=np.int32)
+    
+        # Plot 1: Average viewers by hour
+        ax1.plot(hours, avg_v, marker='o', linewidth=2, markersize=6, color='#2E86AB')
+        ax1.fill_between(hours, avg_v, alpha=0.3, color='#2E86AB')
+        ax1.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
+        ax1.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
+        ax1.set_title('Average Viewers by Hour of Day', fontsize=14, fontweight='bold')
+        ax1.grid(True, alpha=0.3)
+        ax1.set_xticks(range(0, 24, 2))
+    
+        # Highlight peak hour
+        peak_hour_idx = df['avg_viewers'].idxmax()
+        ax1.axvline(x=df.loc[peak_hour_idx, 'hour_of_day'], color='red', linestyle='--', alpha=0.7)
+        ax1.annotate(f'Peak: {int(df.loc[peak_hour_idx, "hour_of_day"])}:00', 
+                    xy=(df.loc[peak_hour_idx, 'hour_of_day'], df.loc[peak_hour_idx, 'avg_viewers']),
+                    xytext=(10, 10), textcoords='offset points',
+                    bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7),
+                    arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
+    
+        # Plot 2: Total viewers by hour
+        ax2.bar(hours, total_v, color='#A23B72', alpha=0.7, edgecolor='black', linewidth=0.5)
+        ax2.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
+        ax2.set_ylabel('Total Viewers', fontsize=12, fontweight='bold')
+        ax2.set_title('Total Viewers by Hour of Day', fontsize=14, fontweight='bold')
+        ax2.grid(True, alpha=0.3, axis='y')
+        ax2.set_xticks(range(0, 24, 2))
+    
+        # Highlight peak hour
+        peak_hour_total_idx = df['total_viewers'].idxmax()
+        ax2.axvline(x=df.loc[peak_hour_total_idx, 'hour_of_day'], color='red', linestyle='--', alpha=0.7)
+    
+        # Plot 3: Stream count by hour
+        ax3.bar(hours, count_v, color='#F18F01', alpha=0.7, edgecolor='black', linewidth=0.5)
+        ax3.set_xlabel('Hour of Day (UTC)', fontsize=12, fontweight='bold')
+        ax3.set_ylabel('Number of Streams', fontsize=12, fontweight='bold')
+        ax3.set_title('Number of Streams by Hour of Day', fontsize=14, fontweight='bold')
+        ax3.grid(True, alpha=0.3, axis='y')
+        ax3.set_xticks(range(0, 24, 2))
+    
+        # Plot 4: Heatmap of viewers by hour (if we had more data)
+        # Create a simple distribution plot
+        ax4.hist(avg_v, bins=20, color='#C73E1D', alpha=0.7, edgecolor='black')
+        ax4.set_xlabel('Average Viewers', fontsize=12, fontweight='bold')
+        ax4.set_ylabel('Frequency (Hours)', fontsize=12, fontweight='bold')
+        ax4.set_title('Distribution of Average Viewers Across Hours', fontsize=14, fontweight='bold')
+        ax4.grid(True, alpha=0.3, axis='y')
+    
+        fig.tight_layout()
+    
+        # Save the plot
+        saves = [save_async(fig, output_path)]
     
     # Create a detailed hourly breakdown table
     print(f"\n=== Hourly Breakdown (Top 10 Hours by Average Viewers) ===")
@@ -125,49 +146,53 @@ def analyse_peak_hours():
         'stream_count': '{:,.0f}'.format
     }))
     
-    # Create a summary plot showing peak vs off-peak
-    fig2, ax5 = plt.subplots(1, 1, figsize=(12, 6))
-    
-    # Categorise hours into peak/off-peak
-    df['category'] = df['avg_viewers'].apply(
-        lambda x: 'Peak Hours' if x > df['avg_viewers'].quantile(0.75) 
-        else 'Off-Peak Hours' if x < df['avg_viewers'].quantile(0.25)
-        else 'Normal Hours'
-    )
-    
-    # Create box plot
+    # Categorise hours into peak/off-peak from the SQL quartile (1 = lowest, 4 = highest)
     categories = ['Off-Peak Hours', 'Normal Hours', 'Peak Hours']
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1']
+    quartile_labels = np.array(['Off-Peak Hours', 'Normal Hours', 'Normal Hours', 'Peak Hours'])
+    df['category'] = quartile_labels[df['quartile'].to_numpy() - 1]
+    
+    if render:
+        # Create a summary plot showing peak vs off-peak
+        fig2, ax5 = get_fig((1, 1), (12, 6))
+
+        # Create box plot
+        colors = ['#FF6B6B', '#4ECDC4', '#45B7D1']
     
-    data_by_category = [df[df['category'] == cat]['avg_viewers'].values for cat in categories]
+        data_by_category = [df[df['category'] == cat]['avg_viewers'].values for cat in categories]
     
-    bp = ax5.boxplot(data_by_category, labels=categories, patch_artist=True)
-    for patch, color in zip(bp['boxes'], colors):
-        patch.set_facecolor(color)
-        patch.set_alpha(0.7)
+        bp = ax5.boxplot(data_by_category, labels=categories, patch_artist=True)
+        for patch, color in zip(bp['boxes'], colors):
+            patch.set_facecolor(color)
+            patch.set_alpha(0.7)
     
-    ax5.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
-    ax5.set_title('Viewership Distribution: Peak vs Off-Peak Hours', fontsize=14, fontweight='bold')
-    ax5.grid(True, alpha=0.3, axis='y')
+        ax5.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
+        ax5.set_title('Viewership Distribution: Peak vs Off-Peak Hours', fontsize=14, fontweight='bold')
+        ax5.grid(True, alpha=0.3, axis='y')
     
-    plt.tight_layout()
+        fig2.tight_layout()
     
-    # Save the summary plot
-    output_path2 = OUTPUT_DIR / "peak_vs_offpeak_analysis.png"
-    plt.savefig(output_path2, dpi=300, bbox_inches='tight')
-    print(f"✅ Summary plot saved to: {output_path2}")
+        # Save the summary plot
+        saves.append(save_async(fig2, output_path2, dpi=SUMMARY_DPI))
     
-    # Show plots
-    plt.show()
+        # Wait for the background PNG writes
+        wait_for_saves(saves)
+        print(f"\n✅ Plot saved to: {output_path}")
+        print(f"✅ Summary plot saved to: {output_path2}")
+        maybe_show(fig, fig2)
+        record_render("peak_hours", signature, OUTPUT_DIR)
+    else:
+        print(f"\n⏭️ Data unchanged since last run; keeping {output_path} and {output_path2}")
     
     # Print insights
-    print(f"\n=== Key Insights ===")
-    print(f"• Peak viewing time: {int(peak_hour_avg['hour_of_day'])}:00 UTC")
-    print(f"• Lowest viewing time: {int(df.loc[df['avg_viewers'].idxmin(), 'hour_of_day'])}:00 UTC")
-    print(f"• Peak hours (top 25%): {df[df['category'] == 'Peak Hours']['hour_of_day'].astype(int).tolist()}")
-    print(f"• Off-peak hours (bottom 25%): {df[df['category'] == 'Off-Peak Hours']['hour_of_day'].astype(int).tolist()}")
-    print(f"• Average viewers during peak hours: {df[df['category'] == 'Peak Hours']['avg_viewers'].mean():,.0f}")
-    print(f"• Average viewers during off-peak hours: {df[df['category'] == 'Off-Peak Hours']['avg_viewers'].mean():,.0f}")
+    print("\n".join([
+        f"\n=== Key Insights ===",
+        f"• Peak viewing time: {int(peak_hour_avg['hour_of_day'])}:00 UTC",
+        f"• Lowest viewing time: {int(df.loc[df['avg_viewers'].idxmin(), 'hour_of_day'])}:00 UTC",
+        f"• Peak hours (top 25%): {df[df['category'] == 'Peak Hours']['hour_of_day'].astype(int).tolist()}",
+        f"• Off-peak hours (bottom 25%): {df[df['category'] == 'Off-Peak Hours']['hour_of_day'].astype(int).tolist()}",
+        f"• Average viewers during peak hours: {df[df['category'] == 'Peak Hours']['avg_viewers'].mean():,.0f}",
+        f"• Average viewers during off-peak hours: {df[df['category'] == 'Off-Peak Hours']['avg_viewers'].mean():,.0f}",
+    ]))
 
 if __name__ == "__main__":
     analyse_peak_hours()
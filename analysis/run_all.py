@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Run every analysis on a single shared database connection.
+Run from project root:  python analysis/run_all.py
+"""
+from pathlib import Path
+import sys
+here = Path(__file__).resolve().parent
+sys.path.append(str(here))
+
+from _db import connect
+from top_games import analyse_top_games
+from peak_hours import analyse_peak_hours
+from weekend_analysis import analyse_weekend_patterns
+
+def run_all_analyses():
+    """Open one tuned connection and run the three aggregations back-to-back on it."""
+    with connect() as conn:
+        analyse_top_games(conn)
+        analyse_peak_hours(conn)
+        analyse_weekend_patterns(conn)
+
+if __name__ == "__main__":
+    run_all_analyses()
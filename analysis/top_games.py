@@ -3,46 +3,69 @@
 Top Games Analysis
 Analyses the most popular games by average viewers and generates visualisations.
 """
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+try:
+    from ._plots import (SUMMARY_DPI, get_fig, maybe_show, plots_up_to_date, record_render,
+                         render_signature, save_async, wait_for_saves)
+except ImportError:  # run as a script: python analysis/top_games.py
+    from _plots import (SUMMARY_DPI, get_fig, maybe_show, plots_up_to_date, record_render,
+                        render_signature, save_async, wait_for_saves)
 from pathlib import Path
+try:
+    from ._db import connect, read_frame
+except ImportError:  # run as a script: python analysis/top_games.py
+    from _db import connect, read_frame
+import numpy as np
 
 # Set up paths
 ROOT = Path(__file__).resolve().parents[1]
-DB_PATH = ROOT / "db" / "twitch.db"
 OUTPUT_DIR = ROOT / "outputs" / "plots"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Set style for better-looking plots
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+def analyse_top_games(conn=None):
+    """Analyse top games by average viewers and generate plots.
 
-def analyse_top_games():
-    """Analyse top games by average viewers and generate plots."""
-    
-    # Connect to database
-    conn = sqlite3.connect(DB_PATH)
+    Pass an open connection to share it with the other analyses; otherwise one is opened here.
+    """
+    if conn is None:
+        with connect() as conn:
+            return analyse_top_games(conn)
     
-    # Query for top games by average viewers
+    # Query for top games: the top 15 by average viewers plus the top 10 by total viewers,
+    # ranked in SQL so only the rows we plot come back
     query = """
-    SELECT 
-        game_name,
-        COUNT(*) as stream_count,
-        AVG(viewer_count) as avg_viewers,
-        SUM(viewer_count) as total_viewers,
-        MAX(viewer_count) as max_viewers
-    FROM streams 
-    WHERE game_name != 'Unknown'
-    GROUP BY game_name 
-    HAVING COUNT(*) >= 5  -- Only games with at least 5 streams
-    ORDER BY avg_viewers DESC 
-    LIMIT 15
+    WITH games AS (
+        SELECT 
+            game_name,
+            COUNT(*) as stream_count,
+            SUM(viewer_count) as total_viewers,
+            MAX(viewer_count) as max_viewers
+        FROM streams 
+        WHERE game_name != 'Unknown'
+        GROUP BY game_name 
+        HAVING COUNT(*) >= 5  -- Only games with at least 5 streams
+    ), ranked AS (
+        SELECT 
+            *,
+            ROW_NUMBER() OVER (ORDER BY total_viewers * 1.0 / stream_count DESC) as avg_rank,
+            ROW_NUMBER() OVER (ORDER BY total_viewers DESC) as total_rank
+        FROM games
+    )
+    SELECT * FROM ranked
+    WHERE avg_rank <= 15 OR total_rank <= 10
+    ORDER BY avg_rank
     """
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    ranked = read_frame(query, conn, dtype={
+        'game_name': 'string[pyarrow]',
+        'stream_count': 'int32[pyarrow]',
+        'avg_rank': 'int16[pyarrow]',
+        'total_rank': 'int16[pyarrow]',
+    })
+    # Average from the SUM/COUNT already fetched rather than a separate AVG aggregate;
+    # numpy float keeps to_string formatters working
+    ranked['avg_viewers'] = ranked['total_viewers'].to_numpy(dtype=np.float64) / ranked['stream_count'].to_numpy(dtype=np.float64)
+    df = ranked[ranked['avg_rank'] <= 15]
+    top_10_total = ranked[ranked['total_rank'] <= 10].sort_values('total_rank')
     
     if df.empty:
         print("No data found for analysis.")
@@ -53,86 +76,99 @@ def analyse_top_games():
     print("\nTop 10 Games by Average Viewers:")
     print(df[['game_name', 'avg_viewers', 'stream_count']].head(10).to_string(index=False))
     
-    # Create the main visualisation
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 12))
-    
-    # Plot 1: Top 10 games by average viewers
-    top_10 = df.head(10)
-    bars1 = ax1.barh(range(len(top_10)), top_10['avg_viewers'], color='skyblue', alpha=0.8)
-    ax1.set_yticks(range(len(top_10)))
-    ax1.set_yticklabels(top_10['game_name'], fontsize=10)
-    ax1.set_xlabel('Average Viewers', fontsize=12, fontweight='bold')
-    ax1.set_title('Top 10 Games by Average Viewers', fontsize=14, fontweight='bold', pad=20)
-    ax1.grid(axis='x', alpha=0.3)
-    
-    # Add value labels on bars
-    for i, (bar, value) in enumerate(zip(bars1, top_10['avg_viewers'])):
-        ax1.text(value + max(top_10['avg_viewers']) * 0.01, bar.get_y() + bar.get_height()/2, 
-                f'{value:,.0f}', va='center', fontsize=9, fontweight='bold')
-    
-    # Plot 2: Top 10 games by total viewers
-    top_10_total = df.nlargest(10, 'total_viewers')
-    bars2 = ax2.barh(range(len(top_10_total)), top_10_total['total_viewers'], color='lightcoral', alpha=0.8)
-    ax2.set_yticks(range(len(top_10_total)))
-    ax2.set_yticklabels(top_10_total['game_name'], fontsize=10)
-    ax2.set_xlabel('Total Viewers', fontsize=12, fontweight='bold')
-    ax2.set_title('Top 10 Games by Total Viewers', fontsize=14, fontweight='bold', pad=20)
-    ax2.grid(axis='x', alpha=0.3)
-    
-    # Add value labels on bars
-    for i, (bar, value) in enumerate(zip(bars2, top_10_total['total_viewers'])):
-        ax2.text(value + max(top_10_total['total_viewers']) * 0.01, bar.get_y() + bar.get_height()/2, 
-                f'{value:,.0f}', va='center', fontsize=9, fontweight='bold')
-    
-    plt.tight_layout()
-    
-    # Save the plot
+    # Redraw only when the ranked games (or this script) changed since the PNGs were written
     output_path = OUTPUT_DIR / "top_games.png"
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"\n✅ Plot saved to: {output_path}")
-    
-    # Create a summary statistics plot
-    fig2, ax3 = plt.subplots(1, 1, figsize=(12, 8))
-    
-    # Scatter plot: Stream count vs Average viewers
-    scatter = ax3.scatter(df['stream_count'], df['avg_viewers'], 
-                         s=df['total_viewers']/1000, alpha=0.6, c=df['total_viewers'], 
-                         cmap='viridis', edgecolors='black', linewidth=0.5)
-    
-    ax3.set_xlabel('Number of Streams', fontsize=12, fontweight='bold')
-    ax3.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
-    ax3.set_title('Game Popularity: Stream Count vs Average Viewers\n(Bubble size = Total Viewers)', 
-                  fontsize=14, fontweight='bold', pad=20)
-    ax3.grid(True, alpha=0.3)
-    
-    # Add colorbar
-    cbar = plt.colorbar(scatter, ax=ax3)
-    cbar.set_label('Total Viewers', fontsize=12, fontweight='bold')
-    
-    # Add labels for top games
-    for idx, row in df.head(5).iterrows():
-        ax3.annotate(row['game_name'], 
-                    (row['stream_count'], row['avg_viewers']),
-                    xytext=(5, 5), textcoords='offset points',
-                    fontsize=8, alpha=0.8)
-    
-    plt.tight_layout()
-    
-    # Save the scatter plot
     output_path2 = OUTPUT_DIR / "game_popularity_analysis.png"
-    plt.savefig(output_path2, dpi=300, bbox_inches='tight')
-    print(f"✅ Scatter plot saved to: {output_path2}")
-    
-    # Show plots
-    plt.show()
+    signature = render_signature(ranked, __file__)
+    render = not plots_up_to_date("top_games", signature, output_path, output_path2)
+    
+    if render:
+        # Create the main visualisation
+        fig, (ax1, ax2) = get_fig((2, 1), (14, 12))
+    
+        # Plot 1: Top 10 games by average viewers
+        top_10 = df.head(10)
+        bars1 = ax1.barh(range(len(top_10)), top_10['avg_viewers'], color='skyblue', alpha=0.8)
+        ax1.set_yticks(range(len(top_10)))
+        ax1.set_yticklabels(top_10['game_name'], fontsize=10)
+        ax1.set_xlabel('Average Viewers', fontsize=12, fontweight='bold')
+        ax1.set_title('Top 10 Games by Average Viewers', fontsize=14, fontweight='bold', pad=20)
+        ax1.grid(axis='x', alpha=0.3)
+    
+        # Add value labels on bars
+        for i, (bar, value) in enumerate(zip(bars1, top_10['avg_viewers'])):
+            ax1.text(value + max(top_10['avg_viewers']) * 0.01, bar.get_y() + bar.get_height()/2, 
+                    f'{value:,.0f}', va='center', fontsize=9, fontweight='bold')
+    
+        # Plot 2: Top 10 games by total viewers
+        bars2 = ax2.barh(range(len(top_10_total)), top_10_total['total_viewers'], color='lightcoral', alpha=0.8)
+        ax2.set_yticks(range(len(top_10_total)))
+        ax2.set_yticklabels(top_10_total['game_name'], fontsize=10)
+        ax2.set_xlabel('Total Viewers', fontsize=12, fontweight='bold')
+        ax2.set_title('Top 10 Games by Total Viewers', fontsize=14, fontweight='bold', pad=20)
+        ax2.grid(axis='x', alpha=0.3)
+    
+        # Add value labels on bars
+        for i, (bar, value) in enumerate(zip(bars2, top_10_total['total_viewers'])):
+            ax2.text(value + max(top_10_total['total_viewers']) * 0.01, bar.get_y() + bar.get_height()/2, 
+                    f'{value:,.0f}', va='center', fontsize=9, fontweight='bold')
+    
+        fig.tight_layout()
+    
+        # Save the plot
+        saves = [save_async(fig, output_path)]
+    
+        # Create a summary statistics plot
+        fig2, ax3 = get_fig((1, 1), (12, 8))
+    
+        # Scatter plot: Stream count vs Average viewers
+        scatter = ax3.scatter(df['stream_count'], df['avg_viewers'], 
+                             s=df['total_viewers']/1000, alpha=0.6, c=df['total_viewers'], 
+                             cmap='viridis', edgecolors='black', linewidth=0.5)
+    
+        ax3.set_xlabel('Number of Streams', fontsize=12, fontweight='bold')
+        ax3.set_ylabel('Average Viewers', fontsize=12, fontweight='bold')
+        ax3.set_title('Game Popularity: Stream Count vs Average Viewers\n(Bubble size = Total Viewers)', 
+                      fontsize=14, fontweight='bold', pad=20)
+        ax3.grid(True, alpha=0.3)
+    
+        # Add colorbar
+        cbar = fig2.colorbar(scatter, ax=ax3)
+        cbar.set_label('Total Viewers', fontsize=12, fontweight='bold')
+    
+        # Add labels for top games
+        top5 = df.head(5)
+        for name, streams, avg in zip(top5['game_name'].to_numpy(), top5['stream_count'].to_numpy(),
+                                      top5['avg_viewers'].to_numpy()):
+            ax3.annotate(name, 
+                        (streams, avg),
+                        xytext=(5, 5), textcoords='offset points',
+                        fontsize=8, alpha=0.8)
+    
+        fig2.tight_layout()
+    
+        # Save the scatter plot
+        saves.append(save_async(fig2, output_path2, dpi=SUMMARY_DPI))
+    
+        # Wait for the background PNG writes
+        wait_for_saves(saves)
+        print(f"\n✅ Plot saved to: {output_path}")
+        print(f"✅ Scatter plot saved to: {output_path2}")
+        maybe_show(fig, fig2)
+        record_render("top_games", signature, OUTPUT_DIR)
+    else:
+        print(f"\n⏭️ Data unchanged since last run; keeping {output_path} and {output_path2}")
     
     # Print summary statistics
-    print(f"\n=== Summary Statistics ===")
-    print(f"Total unique games analysed: {len(df)}")
-    print(f"Total streams analysed: {df['stream_count'].sum()}")
-    print(f"Total viewers across all streams: {df['total_viewers'].sum():,}")
-    print(f"Average viewers per game: {df['avg_viewers'].mean():.0f}")
-    print(f"Most popular game by average viewers: {df.iloc[0]['game_name']} ({df.iloc[0]['avg_viewers']:,.0f} avg viewers)")
+    top = df.iloc[0]
+    print("\n".join([
+        f"\n=== Summary Statistics ===",
+        f"Total unique games analysed: {len(df)}",
+        f"Total streams analysed: {df['stream_count'].sum()}",
+        f"Total viewers across all streams: {df['total_viewers'].sum():,}",
+        f"Average viewers per game: {df['avg_viewers'].mean():.0f}",
+        f"Most popular game by average viewers: {top['game_name']} ({top['avg_viewers']:,.0f} avg viewers)",
+    ]))
 
 if __name__ == "__main__":
     analyse_top_games()
@@ -2,12 +2,15 @@
 """
 Load:
 - Write processed streams into SQLite (or DB in DB_URL)
+- Drop repeated stream ids (Helix pagination can return a stream twice) inside the DB
 - Create helpful indexes
 """
 from pathlib import Path
 import os
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.types import Boolean, Integer, SmallInteger
 from dotenv import load_dotenv
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -18,22 +21,108 @@ PROC = ROOT / "data" / "processed"
 DB_DIR = ROOT / "db"
 DB_DIR.mkdir(parents=True, exist_ok=True)
 
-def run_load(proc_csv: Path | None = None):
-    proc_csv = proc_csv or (PROC / "streams_processed.csv")
-    df = pd.read_csv(proc_csv)
+SQLITE_MAX_VARS = 32_766   # bound parameters per statement since SQLite 3.32
+MAX_CHUNK_ROWS = 10_000
+# Explicit column types, so numeric columns never fall back to TEXT whatever dtype arrives
+STREAM_SQL_TYPES = {
+    "viewer_count": Integer(),
+    "hour_of_day": SmallInteger(),
+    "weekday_num": SmallInteger(),
+    "is_weekend": Boolean(),
+    "is_mature": Boolean(),
+}
+SQLITE_BULK_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",  # WAL stays consistent; only skips the fsync per commit
+    "PRAGMA temp_store=MEMORY;",
+)
 
-    engine = create_engine(DB_URL, future=True)
-    with engine.begin() as conn:
-        df.to_sql("streams", conn, if_exists="replace", index=False)
+def _sqlite_bulk_pragmas(dbapi_conn, _record):
+    # runs on connect, outside any transaction, where journal_mode can still be changed
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_BULK_PRAGMAS:
+        cur.execute(pragma)
+    cur.close()
+
+def _make_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url, future=True)
+    # one shared SQLite connection for the process, so pragmas and WAL setup happen once
+    engine = create_engine(url, future=True, poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _sqlite_bulk_pragmas)
+    return engine
+
+def _timestamps_as_utc_text(df: pd.DataFrame) -> pd.DataFrame:
+    """tz-aware columns back to the '2025-09-12 21:48:35+00:00' text the DB has always held."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.DatetimeTZDtype):
+            df[col] = df[col].dt.tz_convert("UTC").dt.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    return df
+
+def _sqlite_rows(chunk: pd.DataFrame):
+    """Plain Python tuples sqlite3 can bind, with NA/NaN as None."""
+    chunk = chunk.astype(object)
+    return chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+def _sqlite_insert_or_ignore(conn, df: pd.DataFrame) -> int:
+    """Insert through the raw sqlite3 cursor in the caller's transaction; duplicate ids are skipped."""
+    cols = ", ".join(f'"{c}"' for c in df.columns)
+    placeholders = ", ".join("?" * len(df.columns))
+    sql = f"INSERT OR IGNORE INTO streams ({cols}) VALUES ({placeholders})"
+    cur = conn.connection.cursor()
+    inserted = 0
+    try:
+        # one prepared statement, fed a slice at a time so only MAX_CHUNK_ROWS rows are boxed at once
+        for start in range(0, len(df), MAX_CHUNK_ROWS):
+            cur.executemany(sql, _sqlite_rows(df.iloc[start:start + MAX_CHUNK_ROWS]))
+            inserted += cur.rowcount
+    finally:
+        cur.close()
+    return inserted
+
+# Module-level engine (lazy: nothing connects until first use), reused by every run_load call
+ENGINE = _make_engine(DB_URL)
+
+def run_load(proc_path: Path | None = None):
+    proc_path = proc_path or (PROC / "streams_processed.parquet")
+    # Parquet carries started_at as a datetime; keep the UTC offset in the stored text
+    df = _timestamps_as_utc_text(pd.read_parquet(proc_path, engine="pyarrow"))
+
+    # multi-row INSERTs, sliced so pandas never materialises the whole frame as tuples at once
+    chunksize = max(1, min(MAX_CHUNK_ROWS, SQLITE_MAX_VARS // max(len(df.columns), 1)))
+    sql_types = {col: t for col, t in STREAM_SQL_TYPES.items() if col in df.columns}
+    with ENGINE.begin() as conn:
+        # empty target with a unique id, then let the DB skip duplicate ids on insert
+        df.head(0).to_sql("streams", conn, if_exists="replace", index=False, dtype=sql_types)
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uidx_streams_id ON streams(id);"))
+        if ENGINE.dialect.name == "sqlite":
+            loaded = _sqlite_insert_or_ignore(conn, df)
+        else:
+            df.to_sql("_stg_streams", conn, if_exists="replace", index=False, dtype=sql_types,
+                      chunksize=chunksize, method="multi")
+            loaded = conn.execute(text(
+                "INSERT INTO streams SELECT * FROM _stg_streams ON CONFLICT (id) DO NOTHING;"
+            )).rowcount
+            conn.execute(text("DROP TABLE _stg_streams;"))
         try:
             conn.execute(text("CREATE INDEX idx_streams_started ON streams(started_at);"))
             conn.execute(text("CREATE INDEX idx_streams_game ON streams(game_id);"))
-            conn.execute(text("CREATE INDEX idx_streams_lang ON streams(language);"))
-            conn.execute(text("CREATE INDEX idx_streams_hour ON streams(hour_of_day);"))
+            conn.execute(text("CREATE INDEX idx_streams_lang ON streams(language) WHERE language IS NOT NULL;"))
+            # covering (group key, viewer_count) indexes: the analysis aggregates read the index only
+            conn.execute(text("CREATE INDEX idx_streams_hour_viewer ON streams(hour_of_day, viewer_count);"))
+            # partial: 'Unknown' rows are never aggregated, so they stay out of the index entirely
+            conn.execute(text(
+                "CREATE INDEX idx_streams_known_game ON streams(game_name, viewer_count) WHERE game_name != 'Unknown';"
+            ))
+            conn.execute(text(
+                "CREATE INDEX idx_streams_weekday_viewer ON streams(weekday_num, weekday, is_weekend, viewer_count);"
+            ))
+            conn.execute(text("ANALYZE streams;"))  # planner stats so the covering indexes get picked
         except Exception:
             pass
 
-    print(f"✅ Loaded {len(df)} rows into DB → {DB_URL}")
+    print(f"✅ Loaded {loaded} rows into DB → {DB_URL} ({len(df) - loaded} duplicate ids skipped)")
 
 if __name__ == "__main__":
     run_load()
\ No newline at end of file
@@ -3,9 +3,9 @@
 Transform:
 - Parse timestamps
 - Derive hour_of_day, weekday, is_weekend
-- Join game names
+- Look up game names
 - Keep useful columns
-- Save data/processed/streams_processed.csv
+- Save data/processed/streams_processed.parquet
 """
 from pathlib import Path
 import pandas as pd
@@ -16,68 +16,60 @@ RAW = ROOT / "data" / "raw"
 PROC = ROOT / "data" / "processed"
 PROC.mkdir(parents=True, exist_ok=True)
 
-def run_transform(streams_csv: Path | None = None, games_csv: Path | None = None) -> "pd.DataFrame":
-    streams_csv = streams_csv or (RAW / "twitch_streams.csv")
-    games_csv = games_csv or (RAW / "twitch_games.csv")
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
-    s = pd.read_csv(streams_csv)
-    g = pd.read_csv(games_csv) if games_csv.exists() else pd.DataFrame(columns=["id","name"])
+def run_transform(streams_path: Path | None = None, games_path: Path | None = None) -> "pd.DataFrame":
+    streams_path = streams_path or (RAW / "twitch_streams.parquet")
+    games_path = games_path or (RAW / "twitch_games.parquet")
+
+    s = pd.read_parquet(streams_path, engine="pyarrow")
+    g = pd.read_parquet(games_path, engine="pyarrow") if games_path.exists() else pd.DataFrame(columns=["id","name"])
+
+    # Parquet keeps Helix tags as a list; flatten to text so the DB can store them
+    if "tags" in s.columns:
+        s["tags"] = s["tags"].map(lambda t: ",".join(t) if t is not None else None)
 
     # Parse timestamps (Helix field: started_at is ISO 8601, UTC)
     if "started_at" in s.columns:
-        s["started_at"] = pd.to_datetime(s["started_at"], errors="coerce", utc=True)
-        s["hour_of_day"] = s["started_at"].dt.hour
-        s["weekday"] = s["started_at"].dt.day_name()
-        s["is_weekend"] = s["weekday"].isin(["Saturday", "Sunday"])
+        # explicit format skips pandas' per-value format inference
+        ts = pd.to_datetime(s["started_at"], errors="coerce", utc=True, format="ISO8601")
+        s["started_at"] = ts
+        wd = ts.dt.weekday  # Monday=0; NaN where the timestamp didn't parse
+        s["hour_of_day"] = ts.dt.hour.astype("Int8")
+        # day names from the weekday codes instead of building a string per row with day_name()
+        s["weekday"] = pd.Categorical.from_codes(wd.fillna(-1).astype("int8"), categories=WEEKDAYS)
+        s["weekday_num"] = wd.astype("Int8")  # for ordering in SQL
+        s["is_weekend"] = wd >= 5
     else:
         s["hour_of_day"] = np.nan
         s["weekday"] = np.nan
+        s["weekday_num"] = np.nan
         s["is_weekend"] = False
 
-   # --- ensure game_name exists: read games CSV, and fetch any missing IDs ---
-    from auth import auth_headers
-    import requests, time
-
-    g = g.rename(columns={"id": "game_id", "name": "game_name"})  # expected columns
+   # --- ensure game_name exists: read games file, and fetch any missing IDs ---
+    from extract_twitch import ensure_games_cover_streams, write_parquet_atomic
 
     # Ensure keys are strings
     if "game_id" in s.columns: s["game_id"] = s["game_id"].astype(str)
 
-    # If games CSV is empty or lacks names, rebuild it from stream IDs
-    have = set(g["game_id"].astype(str)) if not g.empty and "game_id" in g.columns else set()
-    need = sorted({gid for gid in s["game_id"].dropna().astype(str).unique() if gid and gid not in have})
-
-    def fetch_games_chunk(ids):
-        if not ids: 
-          return []
-        out = []
-        for i in range(0, len(ids), 100):
-            chunk = ids[i:i+100]
-            params = [("id", gid) for gid in chunk]
-            r = requests.get("https://api.twitch.tv/helix/games", headers=auth_headers(), params=params, timeout=30)
-            r.raise_for_status()
-            out.extend(r.json().get("data", []))
-            time.sleep(0.2)
-        return out
-
-    if need:
-        fetched = fetch_games_chunk(need)
-        g_new = pd.DataFrame(fetched)
-        if not g_new.empty:
-            g_new = g_new.rename(columns={"id":"game_id","name":"game_name"})
-            g = pd.concat([g if not g.empty else pd.DataFrame(columns=["game_id","game_name"]), g_new], ignore_index=True)
-            g = g.drop_duplicates(subset=["game_id"])
-
-    # Final join (guarantee columns exist)
+    # Only ids the games file lacks go to Helix, in parallel 100-id chunks under extract's rate limit
+    covered = ensure_games_cover_streams(s, g)
+    if covered is not g:
+        # keep what we fetched so the next run (extract or transform) doesn't ask Helix again
+        write_parquet_atomic(covered, games_path)
+    g = covered.rename(columns={"id": "game_id", "name": "game_name"})  # expected columns
+
+    # Final lookup table (guarantee columns exist)
     if "game_id" in g.columns:
         g["game_id"] = g["game_id"].astype(str)
     else:
         g = pd.DataFrame(columns=["game_id","game_name"])
 
-    # Only merge if we don't already have game names or if they're missing
+    # Only look names up if we don't already have them or if they're missing
     if "game_name" not in s.columns or s["game_name"].isna().all():
-        s = s.merge(g[["game_id","game_name"]], how="left", on="game_id")
-        s["game_name"] = s["game_name"].fillna("Unknown")
+        # dict lookup over the distinct ids (categories) instead of a row-wise merge
+        gmap = dict(zip(g["game_id"], g["game_name"]))
+        s["game_name"] = s["game_id"].astype("category").map(gmap).astype(object).fillna("Unknown")
     else:
         # Keep existing game names, only fill missing ones
         s["game_name"] = s["game_name"].fillna("Unknown")
@@ -90,15 +82,27 @@ def run_transform(streams_csv: Path | None = None, games_csv: Path | None = None
         "game_id", "game_name",
         "type", "title", "viewer_count",
         "language", "broadcaster_language",
-        "started_at", "hour_of_day", "weekday", "is_weekend",
+        "started_at", "hour_of_day", "weekday", "weekday_num", "is_weekend",
         "tags", "is_mature",
     ]
     present = [c for c in keep if c in s.columns]
     out = s[present].copy()
 
-    out_csv = PROC / "streams_processed.csv"
-    out.to_csv(out_csv, index=False)
-    print(f"✅ Transformed {len(out)} rows → {out_csv}")
+    # Narrow numeric/flag columns; Parquet carries these dtypes through to INTEGER columns in the DB
+    if "viewer_count" in out.columns:
+        out["viewer_count"] = out["viewer_count"].fillna(0).astype("int32")
+    if "is_mature" in out.columns:
+        # via nullable boolean: fillna on an object column with gaps is a deprecated downcast
+        out["is_mature"] = out["is_mature"].astype("boolean").fillna(False).astype(bool)
+
+    # Low-cardinality text stored as dictionary-encoded categories; Parquet keeps dtypes for load
+    for col in ("language", "game_name", "weekday", "type"):
+        if col in out.columns:
+            out[col] = out[col].astype("category")
+
+    out_path = PROC / "streams_processed.parquet"
+    out.to_parquet(out_path, engine="pyarrow", compression="zstd", index=False)
+    print(f"✅ Transformed {len(out)} rows → {out_path}")
     return out
 
 if __name__ == "__main__":
@@ -1,21 +1,62 @@
 #!/usr/bin/env python3
 """
 Twitch OAuth (Client Credentials) – fetch an app access token.
+The token is also cached in .twitch_token.json so separate processes
+(e.g. each Airflow task) can reuse it until it expires.
 """
 import os
+import json
 import time
 import requests
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from pathlib import Path
 
+try:
+    import fcntl  # POSIX only; without it the token file is used unlocked
+except ImportError:
+    fcntl = None
+
 ROOT = Path(__file__).resolve().parents[1]
 load_dotenv(ROOT / ".env")
 
 CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+TOKEN_FILE = ROOT / ".twitch_token.json"
+LOCK_FILE = ROOT / ".twitch_token.lock"
 
 _token_cache = {"access_token": None, "expires_at": 0}
+_headers_cache = {}  # access_token -> headers dict; reset whenever the token changes
+
+@contextmanager
+def _token_file_lock():
+    """Hold an exclusive lock so concurrent processes don't all refresh the token."""
+    if fcntl is None:
+        yield
+        return
+    with open(LOCK_FILE, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _read_token_file() -> dict:
+    try:
+        js = json.loads(TOKEN_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+    # ignore tokens issued to a different app
+    return js if js.get("client_id") == CLIENT_ID else {}
+
+def _write_token_file(js: dict):
+    """Write atomically with owner-only permissions."""
+    tmp = TOKEN_FILE.with_suffix(".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as fh:
+        json.dump(js, fh)
+    os.replace(tmp, TOKEN_FILE)
 
 def get_app_token() -> str:
     """Return a valid app access token; refresh if expired."""
@@ -23,27 +64,41 @@ def get_app_token() -> str:
     if _token_cache["access_token"] and now < _token_cache["expires_at"] - 30:
         return _token_cache["access_token"]
 
-    if not CLIENT_ID or not CLIENT_SECRET:
-        raise SystemExit("❌ Set TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET in .env")
-
-    resp = requests.post(
-        TOKEN_URL,
-        params={
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-            "grant_type": "client_credentials",
-        },
-        timeout=30,
-    )
-    resp.raise_for_status()
-    js = resp.json()
-    _token_cache["access_token"] = js["access_token"]
-    _token_cache["expires_at"] = now + int(js.get("expires_in", 3600))
+    with _token_file_lock():
+        # another process may have refreshed it already
+        cached = _read_token_file()
+        if cached.get("access_token") and now < cached.get("expires_at", 0) - 30:
+            _token_cache["access_token"] = cached["access_token"]
+            _token_cache["expires_at"] = cached["expires_at"]
+            return _token_cache["access_token"]
+
+        if not CLIENT_ID or not CLIENT_SECRET:
+            raise SystemExit("❌ Set TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET in .env")
+
+        resp = requests.post(
+            TOKEN_URL,
+            params={
+                "client_id": CLIENT_ID,
+                "client_secret": CLIENT_SECRET,
+                "grant_type": "client_credentials",
+            },
+            timeout=30,
+        )
+        resp.raise_for_status()
+        js = resp.json()
+        _token_cache["access_token"] = js["access_token"]
+        _token_cache["expires_at"] = now + int(js.get("expires_in", 3600))
+        _write_token_file({"client_id": CLIENT_ID, **_token_cache})
     return _token_cache["access_token"]
 
 def auth_headers() -> dict:
-    """Headers required by Helix endpoints."""
-    return {
-        "Authorization": f"Bearer {get_app_token()}",
-        "Client-Id": CLIENT_ID,
-    }
+    """Headers required by Helix endpoints (the same dict is reused while the token is valid)."""
+    token = get_app_token()
+    headers = _headers_cache.get(token)
+    if headers is None:
+        _headers_cache.clear()
+        headers = _headers_cache[token] = {
+            "Authorization": f"Bearer {token}",
+            "Client-Id": CLIENT_ID,
+        }
+    return headers
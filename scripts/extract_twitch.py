@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import os, time, requests, pandas as pd
+import os, time, threading, requests, pandas as pd
+import pyarrow as pa, pyarrow.compute as pc
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from auth import auth_headers
 
@@ -14,54 +17,101 @@ HELIX = "https://api.twitch.tv/helix"
 MAX_PAGES = int(os.getenv("TWITCH_MAX_PAGES", "5"))
 LANG_FILTER = os.getenv("TWITCH_LANG_FILTER", "").strip()
 PER_PAGE = 100
+MAX_WORKERS = 4     # Helix allows 800 req/min per app; 4 in flight stays well under that
+MAX_RETRIES = 5
+POOL_SIZE = 8
+RATE_BURST = 12     # requests allowed to start within any RATE_WINDOW seconds (720/min)
+RATE_WINDOW = 1.0
+
+# One pooled session so TCP/TLS connections are reused across requests and threads
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+
+# Token bucket shared by all worker threads: each request takes a token that a timer hands back later
+_RATE_TOKENS = threading.BoundedSemaphore(RATE_BURST)
+
+def _take_rate_token():
+    _RATE_TOKENS.acquire()
+    t = threading.Timer(RATE_WINDOW, _RATE_TOKENS.release)
+    t.daemon = True
+    t.start()
+
+def helix_get(url, params) -> dict:
+    """GET a Helix endpoint, waiting out 429 responses instead of sleeping between calls."""
+    for _ in range(MAX_RETRIES):
+        _take_rate_token()
+        r = SESSION.get(url, headers=auth_headers(), params=params, timeout=30)
+        if r.status_code != 429:
+            break
+        # Helix sends Ratelimit-Reset (epoch seconds); honour Retry-After if present
+        if "Retry-After" in r.headers:
+            wait = float(r.headers["Retry-After"])
+        else:
+            wait = float(r.headers.get("Ratelimit-Reset", time.time() + 1)) - time.time()
+        time.sleep(max(wait, 0.5))
+    r.raise_for_status()
+    return r.json()
 
 def fetch_streams(max_pages=MAX_PAGES, per_page=PER_PAGE, langs=None) -> pd.DataFrame:
     url = f"{HELIX}/streams"
-    all_rows = []
 
-    def fetch_page(extra_params):
-        r = requests.get(url, headers=auth_headers(), params={"first": per_page, **extra_params}, timeout=30)
-        r.raise_for_status()
-        return r.json()
-
-    lang_list = [s.strip() for s in langs.split(",") if s.strip()] if langs else [None]
-    for lang in lang_list:
-        after = None
+    def fetch_lang(lang):
+        # pages within a language must be fetched in order (cursor chaining)
+        rows, after = [], None
         for _ in range(max_pages):
             extra = {}
             if lang: extra["language"] = lang
             if after: extra["after"] = after
-            js = fetch_page(extra)
+            js = helix_get(url, {"first": per_page, **extra})
             data = js.get("data", [])
-            all_rows.extend(data)
+            rows.extend(data)
             after = js.get("pagination", {}).get("cursor")
             if not after or not data:
                 break
-            time.sleep(0.25)
-    return pd.DataFrame(all_rows)
+        return rows
+
+    lang_list = [s.strip() for s in langs.split(",") if s.strip()] if langs else [None]
+    if not lang_list:  # e.g. TWITCH_LANG_FILTER="," names no languages
+        return pd.DataFrame()
+    # one worker per language (up to the session's pool size) so all languages paginate at once
+    with ThreadPoolExecutor(max_workers=min(len(lang_list), POOL_SIZE)) as pool:
+        per_lang = list(pool.map(fetch_lang, lang_list))
+    return pd.DataFrame([row for rows in per_lang for row in rows])
 
 def fetch_games(game_ids: list[str]) -> pd.DataFrame:
     if not game_ids:
         return pd.DataFrame(columns=["id", "name", "box_art_url"])
-    out = []
-    for i in range(0, len(game_ids), 100):
-        chunk = game_ids[i:i+100]
-        params = [("id", gid) for gid in chunk]
-        r = requests.get(f"{HELIX}/games", headers=auth_headers(), params=params, timeout=30)
-        r.raise_for_status()
-        out.extend(r.json().get("data", []))
-        time.sleep(0.2)
+
+    def fetch_chunk(chunk):
+        return helix_get(f"{HELIX}/games", [("id", gid) for gid in chunk]).get("data", [])
+
+    chunks = [game_ids[i:i+100] for i in range(0, len(game_ids), 100)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        out = [game for data in pool.map(fetch_chunk, chunks) for game in data]
     return pd.DataFrame(out)
 
+def unique_game_ids(game_ids: pd.Series) -> list[str]:
+    """Distinct non-empty ids, deduplicated in Arrow (C++) instead of a Python set."""
+    ids = pc.unique(pc.drop_null(pa.array(game_ids.astype("string"))))
+    return pc.filter(ids, pc.not_equal(ids, "")).to_pylist()
+
 def ensure_games_cover_streams(streams_df: pd.DataFrame, games_df: pd.DataFrame) -> pd.DataFrame:
     # make sure every stream game_id has a row in games
-    have = set(map(str, games_df.get("id", [])))
-    need = sorted({str(g) for g in streams_df.get("game_id", []) if pd.notna(g) and str(g) and str(g) not in have})
-    if not need:
+    empty = pd.Series(dtype="string")
+    have = pd.Index(games_df.get("id", empty).astype("string"))
+    need = pd.Index(streams_df.get("game_id", empty).dropna().astype("string").unique())
+    need = need[(need != "") & ~need.isin(have)]
+    if need.empty:
         return games_df
-    more = fetch_games(need)
+    more = fetch_games(need.tolist())
     return pd.concat([games_df, more], ignore_index=True).drop_duplicates(subset=["id"])
 
+def write_parquet_atomic(df: pd.DataFrame, path: Path):
+    """Write to a temp file and os.replace it in, so a crash never leaves a half-written cache."""
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp, engine="pyarrow", compression="zstd", index=False)
+    os.replace(tmp, path)
+
 def run_extract():
     df = fetch_streams(langs=LANG_FILTER if LANG_FILTER else None)
     if df.empty:
@@ -70,16 +120,19 @@ def run_extract():
     if "game_id" in df.columns:
         df["game_id"] = df["game_id"].astype(str)
 
-    # initial games fetch from unique ids
-    gids = sorted({str(g) for g in df.get("game_id", []) if pd.notna(g) and str(g)})
-    games = fetch_games(gids)
-    games = ensure_games_cover_streams(df, games)  # <- strong fallback
+    # Parquet keeps dtypes and stores columns compressed, so transform skips text parsing
+    streams_path = RAW_DIR / "twitch_streams.parquet"
+    games_path   = RAW_DIR / "twitch_games.parquet"
 
-    streams_path = RAW_DIR / "twitch_streams.csv"
-    games_path   = RAW_DIR / "twitch_games.csv"
+    # games from earlier runs act as a cache: only ids it doesn't cover go to Helix
+    if games_path.exists():
+        games = pd.read_parquet(games_path, engine="pyarrow")
+    else:
+        games = fetch_games(unique_game_ids(df.get("game_id", pd.Series(dtype="string"))))
+    games = ensure_games_cover_streams(df, games)  # <- strong fallback
 
-    df.to_csv(streams_path, index=False, encoding="utf-8")
-    games.to_csv(games_path,   index=False, encoding="utf-8")
+    df.to_parquet(streams_path, engine="pyarrow", compression="zstd", index=False)
+    write_parquet_atomic(games, games_path)
 
     print(f"✅ Saved {len(df)} streams → {streams_path}")
     print(f"✅ Saved {len(games)} games → {games_path}")
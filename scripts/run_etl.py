@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Orchestrate the Twitch ETL: extract → transform → load.
+Orchestrate the Twitch ETL: extract → transform → load (stages hand off via Parquet).
 Run from project root:  python scripts/run_etl.py
 """
 from pathlib import Path